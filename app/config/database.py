@@ -1,5 +1,5 @@
-from motor.motor_asyncio import AsyncIOMotorClient
-from redis.asyncio import Redis
+from pymongo import AsyncMongoClient
+from redis.asyncio import BlockingConnectionPool, Redis
 from app.config.settings import settings
 import logging
 
@@ -10,14 +10,22 @@ class Database:
     """Database connection manager for MongoDB and Redis"""
     
     def __init__(self):
-        self.mongodb_client: AsyncIOMotorClient = None
+        self.mongodb_client: AsyncMongoClient = None
         self.mongodb = None
+        self.redis_pool: BlockingConnectionPool = None
         self.redis_client: Redis = None
     
     async def connect_mongodb(self):
         """Connect to MongoDB"""
         try:
-            self.mongodb_client = AsyncIOMotorClient(settings.MONGODB_URL)
+            self.mongodb_client = AsyncMongoClient(
+                settings.MONGODB_URL,
+                maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+                minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+                maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+                maxConnecting=settings.MONGODB_MAX_CONNECTING,
+                waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS
+            )
             self.mongodb = self.mongodb_client[settings.MONGODB_DB_NAME]
             
             # Test connection
@@ -30,20 +38,26 @@ class Database:
     async def close_mongodb(self):
         """Close MongoDB connection"""
         if self.mongodb_client:
-            self.mongodb_client.close()
+            await self.mongodb_client.close()
             logger.info("MongoDB connection closed")
     
     async def connect_redis(self):
         """Connect to Redis"""
         try:
-            self.redis_client = Redis(
+            self.redis_pool = BlockingConnectionPool(
                 host=settings.REDIS_HOST,
                 port=settings.REDIS_PORT,
                 db=settings.REDIS_DB,
                 password=settings.REDIS_PASSWORD if settings.REDIS_PASSWORD else None,
-                decode_responses=True,
+                max_connections=settings.REDIS_MAX_CONNECTIONS,
+                timeout=settings.REDIS_POOL_TIMEOUT,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                protocol=settings.REDIS_PROTOCOL,
+                socket_keepalive=True,
+                decode_responses=False,
                 socket_connect_timeout=5
             )
+            self.redis_client = Redis(connection_pool=self.redis_pool)
             
             # Test connection
             await self.redis_client.ping()
@@ -56,6 +70,9 @@ class Database:
         """Close Redis connection"""
         if self.redis_client:
             await self.redis_client.close()
+        if self.redis_pool:
+            # A client built on an explicit pool does not disconnect it on close
+            await self.redis_pool.disconnect()
             logger.info("Redis connection closed")
     
     def get_mongodb(self):
@@ -73,9 +90,10 @@ db = Database()
 
 async def get_db():
     """Dependency to get MongoDB instance"""
-    return db.get_mongodb()
+    # Kept async on purpose: FastAPI runs sync dependencies in its threadpool
+    return db.mongodb
 
 
 async def get_redis():
     """Dependency to get Redis instance"""
-    return db.get_redis()
\ No newline at end of file
+    return db.redis_client
\ No newline at end of file
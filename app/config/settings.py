@@ -1,4 +1,4 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List
 import os
 from pathlib import Path
@@ -10,6 +10,7 @@ class Settings(BaseSettings):
     # App Configuration
     APP_NAME: str = "AI-Chatbot-API"
     DEBUG: bool = True
+    SHOW_ERROR_DETAILS: bool = False  # include exception text in 500 responses
     API_VERSION: str = "v1"
     HOST: str = "0.0.0.0"
     PORT: int = 8000
@@ -18,6 +19,8 @@ class Settings(BaseSettings):
     HUGGINGFACE_TOKEN: str
     HUGGINGFACE_MODEL: str = "mistralai/Mistral-7B-Instruct-v0.2"
     MAX_TOKENS: int = 10000
+    HUGGINGFACE_TIMEOUT: float = 30.0  # seconds per inference request
+    MAX_HISTORY_PAIRS: int = 10  # past message pairs sent as model context
     
     # JWT Configuration
     JWT_SECRET_KEY: str
@@ -25,17 +28,33 @@ class Settings(BaseSettings):
     JWT_ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     
+    # Password Hashing
+    BCRYPT_ROUNDS: int = 12  # Each +1 doubles hash/verify CPU cost
+    
     # Redis Configuration
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_PASSWORD: str = ""
+    REDIS_MAX_CONNECTIONS: int = 100
+    REDIS_POOL_TIMEOUT: int = 5  # seconds to wait for a free pooled connection
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # seconds
+    REDIS_PROTOCOL: int = 2  # 3 = RESP3, needs hiredis>=3 for the C parser
     REDIS_TTL_SESSION: int = 86400  # 24 hours
     REDIS_TTL_INTERACTION: int = 1800  # 30 minutes
+    REDIS_MAX_CACHED_MESSAGES: int = 100  # newest messages kept per cached interaction
     
     # MongoDB Configuration
     MONGODB_URL: str
     MONGODB_DB_NAME: str = "chatbot_db"
+    MONGODB_MAX_POOL_SIZE: int = 200
+    MONGODB_MIN_POOL_SIZE: int = 10
+    MONGODB_MAX_IDLE_TIME_MS: int = 300000  # 5 minutes
+    MONGODB_MAX_CONNECTING: int = 4
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 10000
+    WRITE_BATCH_INTERVAL_MS: int = 50  # max delay before queued updates are flushed
+    WRITE_BATCH_MAX_OPS: int = 500  # flush early once this many updates are queued
+    WRITE_BATCH_MAX_RETRIES: int = 3  # re-queue attempts for writes that failed to apply
     
     # Rate Limiting
     RATE_LIMIT_REQUESTS: int = 100
@@ -44,10 +63,11 @@ class Settings(BaseSettings):
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8080"]
     
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
-        case_sensitive = True
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        case_sensitive=True
+    )
 
 
 # Initialize settings
@@ -1,13 +1,20 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from contextlib import asynccontextmanager
+from pymongo import IndexModel
+from pymongo.errors import DuplicateKeyError
+import asyncio
 import logging
+import orjson
 import sys
+import time
 
 from app.config import settings, db
 from app.routes import auth, chat, session
+from app.services import CacheService, ChatService
+from app.utils import format_timestamp, get_current_timestamp
 from app.middleware.error_handler import (
     validation_exception_handler,
     generic_exception_handler
@@ -43,6 +50,13 @@ async def lifespan(app: FastAPI):
         # Create indexes
         await create_indexes()
         
+        # Shared service instance, handed to routes via dependencies;
+        # its CacheService is reached through chat_service.cache
+        app.state.chat_service = ChatService(
+            db.get_mongodb(),
+            CacheService(db.get_redis())
+        )
+        
         logger.info("✅ All services connected successfully")
         logger.info(f"🌐 API running on {settings.HOST}:{settings.PORT}")
         logger.info(f"📚 Documentation: http://{settings.HOST}:{settings.PORT}/docs")
@@ -57,6 +71,8 @@ async def lifespan(app: FastAPI):
     logger.info("🛑 Shutting down AI Chatbot API...")
     
     try:
+        # Flush batched writes before the MongoDB client goes away
+        await app.state.chat_service.close()
         await db.close_mongodb()
         await db.close_redis()
         logger.info("✅ All connections closed")
@@ -69,26 +85,46 @@ async def create_indexes():
     try:
         mongodb = db.get_mongodb()
         
-        # Users collection indexes
-        await mongodb.users.create_index("email", unique=True)
-        await mongodb.users.create_index("user_id", unique=True)
-        
-        # Sessions collection indexes
-        await mongodb.sessions.create_index("session_id", unique=True)
-        await mongodb.sessions.create_index("user_id")
-        await mongodb.sessions.create_index("last_active")
+        await migrate_legacy_ids(mongodb)
+        await drop_legacy_indexes(mongodb)
         
-        # Interactions collection indexes
-        await mongodb.interactions.create_index("interaction_id", unique=True)
-        await mongodb.interactions.create_index("session_id")
-        await mongodb.interactions.create_index("user_id")
-        await mongodb.interactions.create_index("last_message_at")
-        
-        # Refresh tokens collection indexes
-        await mongodb.refresh_tokens.create_index("token_id", unique=True)
-        await mongodb.refresh_tokens.create_index("user_id")
-        await mongodb.refresh_tokens.create_index("refresh_token", unique=True)
-        await mongodb.refresh_tokens.create_index("expires_at")
+        # One createIndexes command per collection, all collections in parallel
+        await asyncio.gather(
+            # Users collection indexes
+            mongodb.users.create_indexes([
+                IndexModel("email", unique=True),
+                IndexModel("user_id", unique=True)
+            ]),
+            # Sessions collection indexes
+            mongodb.sessions.create_indexes([
+                IndexModel("user_id"),
+                IndexModel("last_active")
+            ]),
+            # Interactions collection indexes
+            mongodb.interactions.create_indexes([
+                IndexModel("session_id"),
+                IndexModel("user_id"),
+                IndexModel("last_message_at")
+            ]),
+            # Messages collection indexes (history pages by interaction)
+            mongodb.messages.create_indexes([
+                IndexModel([("interaction_id", 1), ("timestamp", 1)])
+            ]),
+            # Refresh tokens collection indexes
+            mongodb.refresh_tokens.create_indexes([
+                IndexModel("token_id", unique=True),
+                IndexModel("user_id"),
+                # Compound so the /refresh lookup is answered from the index;
+                # partial so legacy plaintext-token documents are not indexed
+                IndexModel(
+                    [("token_hash", 1), ("is_revoked", 1)],
+                    unique=True,
+                    partialFilterExpression={"token_hash": {"$exists": True}}
+                ),
+                # TTL index: MongoDB purges tokens once expires_at has passed
+                IndexModel("expires_at", expireAfterSeconds=0)
+            ])
+        )
         
         logger.info("✅ Database indexes created")
         
@@ -96,12 +132,77 @@ async def create_indexes():
         logger.warning(f"⚠️ Failed to create some indexes: {e}")
 
 
+# Documents written before sessions/interactions were keyed by their
+# generated ID still carry a MongoDB ObjectId in _id
+LEGACY_ID_FILTER = {"_id": {"$type": "objectId"}}
+
+
+async def migrate_legacy_ids(mongodb):
+    """Re-key legacy sessions and interactions by their generated ID (idempotent)"""
+    for collection, id_field in (
+        (mongodb.sessions, "session_id"),
+        (mongodb.interactions, "interaction_id")
+    ):
+        migrated = 0
+        async for doc in collection.find(LEGACY_ID_FILTER):
+            legacy_id = doc["_id"]
+            doc["_id"] = doc[id_field]
+            # _id is immutable, so the document is replaced. The old copy goes
+            # first because the legacy unique index on id_field still exists
+            await collection.delete_one({"_id": legacy_id})
+            try:
+                await collection.insert_one(doc)
+            except DuplicateKeyError:
+                # Already re-keyed by an earlier, interrupted run
+                pass
+            except Exception:
+                doc["_id"] = legacy_id
+                await collection.insert_one(doc)
+                raise
+            migrated += 1
+        
+        if migrated:
+            logger.info(f"Re-keyed {migrated} legacy {collection.name} documents by {id_field}")
+
+
+async def drop_legacy_indexes(mongodb):
+    """Drop indexes whose options have changed so they can be recreated"""
+    refresh_token_indexes = await mongodb.refresh_tokens.index_information()
+    
+    # expires_at used to be a plain index; it is now a TTL index
+    expires_index = refresh_token_indexes.get("expires_at_1")
+    if expires_index and "expireAfterSeconds" not in expires_index:
+        await mongodb.refresh_tokens.drop_index("expires_at_1")
+        logger.info("Dropped legacy index refresh_tokens.expires_at_1")
+    
+    # Refresh tokens are now looked up by token_hash, not the plaintext token
+    for index_name in ("refresh_token_1", "refresh_token_1_is_revoked_1"):
+        if index_name in refresh_token_indexes:
+            await mongodb.refresh_tokens.drop_index(index_name)
+            logger.info(f"Dropped legacy index refresh_tokens.{index_name}")
+    
+    # Sessions and interactions are keyed by their generated ID in _id, which
+    # makes the separate unique indexes on those fields redundant. They are
+    # kept until every legacy document has been re-keyed
+    for collection, index_name in (
+        (mongodb.sessions, "session_id_1"),
+        (mongodb.interactions, "interaction_id_1")
+    ):
+        if await collection.find_one(LEGACY_ID_FILTER, {"_id": 1}):
+            logger.warning(f"Keeping {collection.name}.{index_name}: legacy documents remain")
+            continue
+        if index_name in await collection.index_information():
+            await collection.drop_index(index_name)
+            logger.info(f"Dropped legacy index {collection.name}.{index_name}")
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title=settings.APP_NAME,
     description="Production-ready AI Chatbot API with HuggingFace integration",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_url="/openapi.json"
@@ -112,8 +213,8 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
 )
 
 # Exception handlers
@@ -126,57 +227,70 @@ app.include_router(chat.router, prefix=f"/api/{settings.API_VERSION}")
 app.include_router(session.router, prefix=f"/api/{settings.API_VERSION}")
 
 
+# Static payload for the root endpoint, serialized once at import
+_ROOT_RESPONSE = orjson.dumps({
+    "status": "healthy",
+    "service": settings.APP_NAME,
+    "version": "1.0.0",
+    "api_version": settings.API_VERSION,
+    "docs": "/docs"
+})
+
+
 @app.get("/")
 async def root():
     """Root endpoint - API health check"""
-    return {
-        "status": "healthy",
-        "service": settings.APP_NAME,
-        "version": "1.0.0",
-        "api_version": settings.API_VERSION,
-        "docs": f"/docs"
-    }
+    return Response(content=_ROOT_RESPONSE, media_type="application/json")
+
+
+# Last health probe result; reused for HEALTH_CACHE_SECONDS to spare the backends
+HEALTH_CACHE_SECONDS = 2.0
+_last_health = {"checked_at": 0.0, "response": None}
 
 
 @app.get("/health")
 async def health_check():
     """Detailed health check endpoint"""
     try:
-        # Check MongoDB
-        mongodb_status = "connected"
-        try:
-            await db.mongodb_client.admin.command('ping')
-        except:
-            mongodb_status = "disconnected"
-        
-        # Check Redis
-        redis_status = "connected"
-        try:
-            await db.redis_client.ping()
-        except:
-            redis_status = "disconnected"
+        now = time.monotonic()
+        if (
+            _last_health["response"] is not None and
+            now - _last_health["checked_at"] < HEALTH_CACHE_SECONDS
+        ):
+            return _last_health["response"]
+        
+        # Ping MongoDB and Redis concurrently
+        mongodb_ping, redis_ping = await asyncio.gather(
+            db.mongodb_client.admin.command('ping'),
+            db.redis_client.ping(),
+            return_exceptions=True
+        )
+        mongodb_status = "disconnected" if isinstance(mongodb_ping, Exception) else "connected"
+        redis_status = "disconnected" if isinstance(redis_ping, Exception) else "connected"
         
         overall_status = "healthy" if (
             mongodb_status == "connected" and 
             redis_status == "connected"
         ) else "unhealthy"
         
-        return {
+        response = {
             "status": overall_status,
             "services": {
                 "mongodb": mongodb_status,
                 "redis": redis_status,
                 "ai_service": "ready"
             },
-            "timestamp": logging.Formatter().formatTime(logging.LogRecord(
-                name="", level=0, pathname="", lineno=0,
-                msg="", args=(), exc_info=None
-            ))
+            "timestamp": format_timestamp(get_current_timestamp())
         }
         
+        _last_health["checked_at"] = now
+        _last_health["response"] = response
+        
+        return response
+        
     except Exception as e:
         logger.error(f"Health check failed: {e}")
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={
                 "status": "unhealthy",
@@ -193,5 +307,7 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        loop="uvloop",
+        http="httptools",
         log_level="debug" if settings.DEBUG else "info"
     )
\ No newline at end of file
@@ -1,17 +1,32 @@
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import HTTPException, Request, status
 from app.services.auth_service import auth_service
 from typing import Dict
 import logging
 
 logger = logging.getLogger(__name__)
 
-security = HTTPBearer()
+
+def _get_bearer_token(request: Request) -> str:
+    """
+    Extract the bearer token from the Authorization header
+    
+    Raises:
+        HTTPException: If the header is missing or not a bearer token
+    """
+    authorization = request.headers.get("authorization")
+    if authorization:
+        scheme, _, token = authorization.partition(" ")
+        if token and scheme.lower() == "bearer":
+            return token
+    
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> Dict[str, str]:
+async def get_current_user(request: Request) -> Dict[str, str]:
     """
     Dependency to get current authenticated user from JWT token
     
@@ -21,7 +36,7 @@ async def get_current_user(
     Raises:
         HTTPException: If token is invalid or expired
     """
-    token = credentials.credentials
+    token = _get_bearer_token(request)
     
     payload = auth_service.verify_access_token(token)
     
@@ -39,9 +54,7 @@ async def get_current_user(
     }
 
 
-async def verify_refresh_token(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
-) -> Dict[str, str]:
+async def verify_refresh_token(request: Request) -> Dict[str, str]:
     """
     Dependency to verify refresh token
     
@@ -51,7 +64,7 @@ async def verify_refresh_token(
     Raises:
         HTTPException: If token is invalid or expired
     """
-    token = credentials.credentials
+    token = _get_bearer_token(request)
     
     payload = auth_service.verify_refresh_token(token)
     
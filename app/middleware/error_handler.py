@@ -1,43 +1,49 @@
 from fastapi import Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.exceptions import RequestValidationError
+from app.config.settings import settings
 from app.utils import build_error_response
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Whether 500 responses include the exception message (may leak hosts/URIs)
+_SHOW_DETAILS = settings.SHOW_ERROR_DETAILS
+
 
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle Pydantic validation errors"""
-    errors = []
-    for error in exc.errors():
-        errors.append({
-            "field": " -> ".join(str(loc) for loc in error["loc"]),
+    errors = [
+        {
+            "field": " -> ".join(map(str, error["loc"])),
             "message": error["msg"],
             "type": error["type"]
-        })
+        }
+        for error in exc.errors()
+    ]
     
     logger.warning(f"Validation error: {errors}")
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content=build_error_response(
             code="VALIDATION_ERROR",
             message="Request validation failed",
-            details=str(errors)
+            details=errors
         )
     )
 
 
 async def generic_exception_handler(request: Request, exc: Exception):
     """Handle all uncaught exceptions"""
-    logger.error(f"Unhandled exception: {str(exc)}", exc_info=True)
+    error_msg = str(exc)
+    logger.error(f"Unhandled exception: {error_msg}", exc_info=True)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content=build_error_response(
             code="INTERNAL_SERVER_ERROR",
             message="An unexpected error occurred",
-            details=str(exc) if logger.level == logging.DEBUG else None
+            details=error_msg if _SHOW_DETAILS else None
         )
     )
\ No newline at end of file
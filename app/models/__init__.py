@@ -23,11 +23,12 @@ from app.models.db_models import (
     user_document,
     session_document,
     interaction_document,
-    message_pair,
+    message_document,
     refresh_token_document,
     USERS_COLLECTION,
     SESSIONS_COLLECTION,
     INTERACTIONS_COLLECTION,
+    MESSAGES_COLLECTION,
     REFRESH_TOKENS_COLLECTION
 )
 
@@ -53,10 +54,11 @@ __all__ = [
     "user_document",
     "session_document",
     "interaction_document",
-    "message_pair",
+    "message_document",
     "refresh_token_document",
     "USERS_COLLECTION",
     "SESSIONS_COLLECTION",
     "INTERACTIONS_COLLECTION",
+    "MESSAGES_COLLECTION",
     "REFRESH_TOKENS_COLLECTION"
 ]
\ No newline at end of file
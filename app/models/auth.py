@@ -1,7 +1,12 @@
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional
 import re
 
+# Password complexity checks, compiled once at import
+_HAS_UPPER = re.compile(r'[A-Z]').search
+_HAS_LOWER = re.compile(r'[a-z]').search
+_HAS_DIGIT = re.compile(r'[0-9]').search
+
 
 class UserRegisterRequest(BaseModel):
     """Request model for user registration"""
@@ -9,16 +14,17 @@ class UserRegisterRequest(BaseModel):
     password: str = Field(..., min_length=8, max_length=72, description="User password")
     name: Optional[str] = Field(None, max_length=100, description="User name")
     
-    @validator('password')
-    def validate_password(cls, v):
+    @field_validator('password')
+    @classmethod
+    def validate_password(cls, v: str) -> str:
         if len(v.encode("utf-8")) > 72:
             raise ValueError("Password cannot exceed 72 bytes")
         
-        if not re.search(r'[A-Z]', v):
+        if not _HAS_UPPER(v):
             raise ValueError('Password must contain at least one uppercase letter')
-        if not re.search(r'[a-z]', v):
+        if not _HAS_LOWER(v):
             raise ValueError('Password must contain at least one lowercase letter')
-        if not re.search(r'[0-9]', v):
+        if not _HAS_DIGIT(v):
             raise ValueError('Password must contain at least one digit')
         
         return v
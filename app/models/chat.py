@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -10,8 +10,9 @@ class ChatMessageRequest(BaseModel):
     interaction_id: Optional[str] = Field(None, description="Existing interaction ID")
     message: str = Field(..., min_length=1, max_length=10000, description="User message")
     
-    @validator('message')
-    def sanitize_message(cls, v):
+    @field_validator('message')
+    @classmethod
+    def sanitize_message(cls, v: str) -> str:
         return v.strip()
 
 
@@ -1,5 +1,6 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from app.utils import hash_token
 
 
 # MongoDB Document Schemas (as dictionaries)
@@ -11,13 +12,14 @@ def user_document(
     name: Optional[str] = None
 ) -> Dict[str, Any]:
     """Schema for users collection"""
+    now = datetime.utcnow()
     return {
         "user_id": user_id,
         "email": email,
         "hashed_password": hashed_password,
         "name": name,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
+        "created_at": now,
+        "updated_at": now,
         "is_active": True
     }
 
@@ -26,13 +28,15 @@ def session_document(
     session_id: str,
     user_id: str
 ) -> Dict[str, Any]:
-    """Schema for sessions collection"""
+    """Schema for sessions collection (keyed by session_id)"""
+    now = datetime.utcnow()
     return {
+        "_id": session_id,
         "session_id": session_id,
         "user_id": user_id,
         "interaction_ids": [],
-        "created_at": datetime.utcnow(),
-        "last_active": datetime.utcnow(),
+        "created_at": now,
+        "last_active": now,
         "is_active": True
     }
 
@@ -42,28 +46,35 @@ def interaction_document(
     session_id: str,
     user_id: str
 ) -> Dict[str, Any]:
-    """Schema for interactions collection"""
+    """Schema for interactions collection (keyed by interaction_id)"""
+    now = datetime.utcnow()
     return {
+        "_id": interaction_id,
         "interaction_id": interaction_id,
         "session_id": session_id,
         "user_id": user_id,
-        "messages": [],
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
-        "last_message_at": datetime.utcnow(),
+        "messages_count": 0,
+        "created_at": now,
+        "updated_at": now,
+        "last_message_at": now,
         "is_active": True
     }
 
 
-def message_pair(
+def message_document(
     message_id: str,
+    interaction_id: str,
+    user_id: str,
     user_message: str,
     ai_response: str,
     metadata: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
-    """Schema for message pair within interaction"""
+    """Schema for messages collection (one message pair per document)"""
     return {
+        "_id": message_id,
         "message_id": message_id,
+        "interaction_id": interaction_id,
+        "user_id": user_id,
         "user_message": user_message,
         "ai_response": ai_response,
         "timestamp": datetime.utcnow(),
@@ -77,11 +88,11 @@ def refresh_token_document(
     refresh_token: str,
     expires_at: datetime
 ) -> Dict[str, Any]:
-    """Schema for refresh_tokens collection"""
+    """Schema for refresh_tokens collection (stores only the token's hash)"""
     return {
         "token_id": token_id,
         "user_id": user_id,
-        "refresh_token": refresh_token,
+        "token_hash": hash_token(refresh_token),
         "created_at": datetime.utcnow(),
         "expires_at": expires_at,
         "is_revoked": False
@@ -92,4 +103,5 @@ def refresh_token_document(
 USERS_COLLECTION = "users"
 SESSIONS_COLLECTION = "sessions"
 INTERACTIONS_COLLECTION = "interactions"
+MESSAGES_COLLECTION = "messages"
 REFRESH_TOKENS_COLLECTION = "refresh_tokens"
\ No newline at end of file
@@ -1,7 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from redis.asyncio import Redis
-from app.config import get_db, get_redis
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from app.models import (
     ChatMessageRequest,
     NewInteractionRequest,
@@ -9,7 +6,7 @@ from app.models import (
     InteractionResponse,
     ChatHistoryResponse
 )
-from app.services import ChatService, CacheService
+from app.services import ChatService
 from app.middleware.auth import get_current_user
 from app.utils import build_success_response, build_error_response
 from typing import Dict, Optional
@@ -20,26 +17,16 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
 
-async def get_chat_service(
-    db: AsyncIOMotorDatabase = Depends(get_db),
-    redis: Redis = Depends(get_redis)
-) -> ChatService:
-    """Dependency to get ChatService instance"""
-    cache_service = CacheService(redis)
-    return ChatService(db, cache_service)
-
-
-async def get_cache_service(redis: Redis = Depends(get_redis)) -> CacheService:
-    """Dependency to get CacheService instance"""
-    return CacheService(redis)
+async def get_chat_service(request: Request) -> ChatService:
+    """Dependency to get the shared ChatService instance"""
+    return request.app.state.chat_service
 
 
 @router.post("/message", response_model=dict)
 async def send_message(
     request: ChatMessageRequest,
     current_user: Dict = Depends(get_current_user),
-    chat_service: ChatService = Depends(get_chat_service),
-    cache_service: CacheService = Depends(get_cache_service)
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """
     Send a message and receive AI response
@@ -52,12 +39,11 @@ async def send_message(
         user_id = current_user["user_id"]
         
         # Check rate limit
-        within_limit = await cache_service.check_rate_limit(user_id)
+        within_limit, retry_after = await chat_service.cache.check_rate_limit(user_id)
         if not within_limit:
-            rate_info = await cache_service.get_rate_limit_info(user_id)
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail=f"Rate limit exceeded. Try again in {rate_info['reset_in_seconds']} seconds"
+                detail=f"Rate limit exceeded. Try again in {retry_after} seconds"
             )
         
         # Send message
@@ -112,15 +98,7 @@ async def create_new_interaction(
     try:
         user_id = current_user["user_id"]
         
-        # Verify session belongs to user
-        session = await chat_service.get_session(request.session_id, user_id)
-        if not session:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Session not found or does not belong to user"
-            )
-        
-        # Create new interaction
+        # Create new interaction (also verifies session ownership)
         result = await chat_service.create_interaction(
             session_id=request.session_id,
             user_id=user_id
@@ -133,8 +111,12 @@ async def create_new_interaction(
             message="New interaction created successfully"
         )
         
-    except HTTPException:
-        raise
+    except ValueError as ve:
+        logger.warning(f"Validation error: {ve}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(ve)
+        )
     except Exception as e:
         logger.error(f"Failed to create interaction: {e}")
         raise HTTPException(
@@ -146,7 +128,7 @@ async def create_new_interaction(
 @router.get("/history/{interaction_id}", response_model=dict)
 async def get_chat_history(
     interaction_id: str,
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=500, description="Number of messages to retrieve"),
     current_user: Dict = Depends(get_current_user),
     chat_service: ChatService = Depends(get_chat_service)
 ):
@@ -161,7 +143,7 @@ async def get_chat_history(
         history = await chat_service.get_chat_history(
             user_id=user_id,
             interaction_id=interaction_id,
-            limit=min(limit, 500)  # Max 500 messages
+            limit=limit
         )
         
         logger.info(f"Chat history retrieved for interaction: {interaction_id}")
@@ -228,7 +210,7 @@ async def delete_interaction(
 @router.get("/rate-limit", response_model=dict)
 async def get_rate_limit_status(
     current_user: Dict = Depends(get_current_user),
-    cache_service: CacheService = Depends(get_cache_service)
+    chat_service: ChatService = Depends(get_chat_service)
 ):
     """
     Get current rate limit status for the user
@@ -238,7 +220,7 @@ async def get_rate_limit_status(
     try:
         user_id = current_user["user_id"]
         
-        rate_info = await cache_service.get_rate_limit_info(user_id)
+        rate_info = await chat_service.cache.get_rate_limit_info(user_id)
         
         return build_success_response(
             data=rate_info,
@@ -1,11 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from redis.asyncio import Redis
-from app.config import get_db, get_redis
-from app.services import ChatService, CacheService
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from app.services import ChatService
 from app.middleware.auth import get_current_user
 from app.utils import build_success_response, format_timestamp
 from typing import Dict
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,13 +11,9 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/session", tags=["Session"])
 
 
-async def get_chat_service(
-    db: AsyncIOMotorDatabase = Depends(get_db),
-    redis: Redis = Depends(get_redis)
-) -> ChatService:
-    """Dependency to get ChatService instance"""
-    cache_service = CacheService(redis)
-    return ChatService(db, cache_service)
+async def get_chat_service(request: Request) -> ChatService:
+    """Dependency to get the shared ChatService instance"""
+    return request.app.state.chat_service
 
 
 @router.post("/create", response_model=dict, status_code=status.HTTP_201_CREATED)
@@ -112,27 +106,35 @@ async def delete_session(
     try:
         user_id = current_user["user_id"]
         
-        # Verify session belongs to user
-        session = await chat_service.get_session(session_id, user_id)
+        # Verify ownership and delete the session in a single round trip
+        session = await chat_service.sessions_collection.find_one_and_delete(
+            {"_id": session_id, "user_id": user_id},
+            projection={"_id": 0, "interaction_ids": 1}
+        )
         if not session:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Session not found or does not belong to user"
             )
         
-        # Delete all interactions in the session
+        # Delete all interactions in the session concurrently
         interaction_ids = session.get("interaction_ids", [])
-        for interaction_id in interaction_ids:
-            try:
-                await chat_service.delete_interaction(user_id, interaction_id)
-            except Exception as e:
-                logger.warning(f"Failed to delete interaction {interaction_id}: {e}")
-        
-        # Delete session from MongoDB
-        sessions_collection = chat_service.db["sessions"]
-        await sessions_collection.delete_one({"session_id": session_id})
+        results = await asyncio.gather(
+            *(
+                chat_service.delete_interaction(
+                    user_id,
+                    interaction_id,
+                    detach_from_session=False
+                )
+                for interaction_id in interaction_ids
+            ),
+            return_exceptions=True
+        )
+        for interaction_id, result in zip(interaction_ids, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to delete interaction {interaction_id}: {result}")
         
-        # Delete from cache
+        # Drop the cached session
         await chat_service.cache.delete_session(session_id)
         
         logger.info(f"Session deleted: {session_id}")
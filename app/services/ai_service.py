@@ -1,4 +1,4 @@
-from huggingface_hub import InferenceClient
+from huggingface_hub import AsyncInferenceClient
 from app.config.settings import settings
 from typing import List, Dict
 import logging
@@ -11,9 +11,13 @@ class AIService:
     
     def __init__(self):
         """Initialize HuggingFace client"""
-        self.client = InferenceClient(token=settings.HUGGINGFACE_TOKEN)
+        self.client = AsyncInferenceClient(
+            token=settings.HUGGINGFACE_TOKEN,
+            timeout=settings.HUGGINGFACE_TIMEOUT
+        )
         self.model = settings.HUGGINGFACE_MODEL
         self.max_tokens = settings.MAX_TOKENS
+        self.max_history_pairs = settings.MAX_HISTORY_PAIRS
     
     async def generate_response(self, messages: List[Dict[str, str]]) -> str:
         """
@@ -33,7 +37,7 @@ class AIService:
             logger.info(f"Sending request to HuggingFace model: {self.model}")
             logger.debug(f"Messages: {messages}")
             
-            response = self.client.chat_completion(
+            response = await self.client.chat_completion(
                 model=self.model,
                 messages=messages,
                 max_tokens=self.max_tokens
@@ -58,30 +62,32 @@ class AIService:
         
         Args:
             messages_history: List of previous message pairs
-                             [{"user": "...", "assistant": "..."}]
+                             [{"user": "...", "assistant": "..."}]; only the
+                             last MAX_HISTORY_PAIRS are kept
             current_message: Current user message
         
         Returns:
             Formatted messages list for AI model
         """
-        formatted_messages = []
+        # Only the most recent pairs are sent; prompt cost grows with length
+        recent = messages_history[-self.max_history_pairs:] if self.max_history_pairs > 0 else []
+        formatted_messages: List[Dict[str, str]] = [None] * (2 * len(recent) + 1)
         
-        # Add all previous messages
-        for msg in messages_history:
-            formatted_messages.append({
+        for i, msg in enumerate(recent):
+            formatted_messages[2 * i] = {
                 "role": "user",
                 "content": msg.get("user_message", "")
-            })
-            formatted_messages.append({
+            }
+            formatted_messages[2 * i + 1] = {
                 "role": "assistant",
                 "content": msg.get("ai_response", "")
-            })
+            }
         
         # Add current message
-        formatted_messages.append({
+        formatted_messages[-1] = {
             "role": "user",
             "content": current_message
-        })
+        }
         
         return formatted_messages
 
@@ -1,16 +1,23 @@
 from passlib.context import CryptContext
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from cachetools import TTLCache
+from jose import ExpiredSignatureError, JWTError, jwt
 from app.config.settings import settings
-from app.utils import generate_uuid, get_current_timestamp
-from typing import Optional, Dict
+from app.utils import generate_uuid, get_current_timestamp, hash_token
+from typing import Optional, Dict, Tuple
 import logging
 import hashlib
+import time
 
 logger = logging.getLogger(__name__)
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; hashes made with any other cost are flagged for rehash
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    bcrypt__rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+    deprecated="auto"
+)
 
 
 class AuthService:
@@ -21,20 +28,36 @@ class AuthService:
         self.algorithm = settings.JWT_ALGORITHM
         self.access_token_expire = settings.JWT_ACCESS_TOKEN_EXPIRE_MINUTES
         self.refresh_token_expire = settings.JWT_REFRESH_TOKEN_EXPIRE_DAYS
+        # Decoded payloads keyed by token fingerprint -> (exp, payload)
+        self._token_cache: TTLCache = TTLCache(maxsize=50000, ttl=300)
 
-    def hash_password(self, password: str) -> str:
+    def _prehash(self, password: str) -> str:
         # Pre-hash to avoid bcrypt 72-byte limit
-        sha256_hash = hashlib.sha256(password.encode("utf-8")).hexdigest()
-        return pwd_context.hash(sha256_hash)
+        return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+    def hash_password(self, password: str) -> str:
+        return pwd_context.hash(self._prehash(password))
 
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        sha256_hash = hashlib.sha256(plain_password.encode("utf-8")).hexdigest()
-        return pwd_context.verify(sha256_hash, hashed_password)
+        return pwd_context.verify(self._prehash(plain_password), hashed_password)
+
+    def verify_and_update_password(
+        self,
+        plain_password: str,
+        hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        Verify password and rehash it if stored with a different bcrypt cost
+        
+        Returns:
+            (is_valid, new_hash) - new_hash is None unless the hash needs replacing
+        """
+        return pwd_context.verify_and_update(self._prehash(plain_password), hashed_password)
 
         
     def create_access_token(self, user_id: str, email: str) -> str:
         """Create JWT access token"""
-        expire = datetime.utcnow() + timedelta(minutes=self.access_token_expire)
+        expire = int(time.time()) + self.access_token_expire * 60
         
         payload = {
             "user_id": user_id,
@@ -46,29 +69,41 @@ class AuthService:
         token = jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
         return token
     
-    def create_refresh_token(self, user_id: str, email: str) -> str:
-        """Create JWT refresh token"""
-        expire = datetime.utcnow() + timedelta(days=self.refresh_token_expire)
+    def create_refresh_token(self, user_id: str, email: str, token_id: str) -> str:
+        """Create JWT refresh token, unique per token_id (jti)"""
+        expire = int(time.time()) + self.refresh_token_expire * 86400
         
         payload = {
             "user_id": user_id,
             "email": email,
             "exp": expire,
-            "type": "refresh"
+            "type": "refresh",
+            "jti": token_id
         }
         
         token = jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
         return token
     
     def decode_token(self, token: str) -> Optional[Dict]:
-        """Decode and validate JWT token"""
+        """Decode and validate JWT token (jose enforces exp)"""
+        key = hash_token(token)
+        
+        cached = self._token_cache.get(key)
+        if cached and cached[0] > int(time.time()):
+            return cached[1]
+        
         try:
             payload = jwt.decode(
                 token, 
                 self.secret_key, 
                 algorithms=[self.algorithm]
             )
+            if payload.get("exp"):
+                self._token_cache[key] = (payload["exp"], payload)
             return payload
+        except ExpiredSignatureError:
+            logger.warning("JWT token expired")
+            return None
         except JWTError as e:
             logger.error(f"JWT decode error: {e}")
             return None
@@ -84,12 +119,6 @@ class AuthService:
             logger.warning("Invalid token type - expected access token")
             return None
         
-        # Check expiration
-        exp = payload.get("exp")
-        if exp and datetime.utcnow() > datetime.fromtimestamp(exp):
-            logger.warning("Access token expired")
-            return None
-        
         return payload
     
     def verify_refresh_token(self, token: str) -> Optional[Dict]:
@@ -103,12 +132,6 @@ class AuthService:
             logger.warning("Invalid token type - expected refresh token")
             return None
         
-        # Check expiration
-        exp = payload.get("exp")
-        if exp and datetime.utcnow() > datetime.fromtimestamp(exp):
-            logger.warning("Refresh token expired")
-            return None
-        
         return payload
 
 
@@ -1,11 +1,142 @@
 from redis.asyncio import Redis
+from cachetools import TTLCache
 from app.config.settings import settings
 from app.utils import serialize_for_redis, deserialize_from_redis
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import logging
+import math
+import time
+import zstandard
 
 logger = logging.getLogger(__name__)
 
+# Token bucket rate limiter, evaluated atomically in a single round trip.
+# KEYS[1] = bucket hash {tokens, ts}
+# ARGV = capacity, refill rate in tokens per millisecond, cost (0 = peek)
+# Returns {allowed, whole tokens left, ms until the bucket is full,
+#          ms until the request would be allowed (0 when allowed)}
+RATE_LIMIT_SCRIPT = """
+redis.replicate_commands()
+local capacity = tonumber(ARGV[1])
+local refill_per_ms = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill_per_ms)
+
+local allowed = 0
+local retry_after_ms = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after_ms = math.ceil((cost - tokens) / refill_per_ms)
+end
+
+local ms_until_full = math.ceil((capacity - tokens) / refill_per_ms)
+if cost > 0 then
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.max(ms_until_full, 1))
+end
+
+return {allowed, math.floor(tokens), ms_until_full, retry_after_ms}
+"""
+
+# Return a cached session only if it belongs to the user, refreshing its TTL.
+# KEYS[1] = session key
+# ARGV = user_id, ttl in milliseconds
+SESSION_FOR_USER_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return false
+end
+
+local ok, session = pcall(cjson.decode, value)
+if not ok or session['user_id'] ~= ARGV[1] then
+    return false
+end
+
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return value
+"""
+
+# Append an interaction ID to a cached session in place, keeping its TTL.
+# KEYS[1] = session key
+# ARGV = interaction_id
+# Returns 1 if the session was cached and updated, 0 otherwise
+APPEND_INTERACTION_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return 0
+end
+
+local session = cjson.decode(value)
+if type(session['interaction_ids']) ~= 'table' then
+    session['interaction_ids'] = {}
+end
+table.insert(session['interaction_ids'], ARGV[1])
+session['last_active'] = ARGV[2]
+
+redis.call('SET', KEYS[1], cjson.encode(session), 'KEEPTTL')
+return 1
+"""
+
+TOUCH_SESSION_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return 0
+end
+
+local session = cjson.decode(value)
+session['last_active'] = ARGV[1]
+
+redis.call('SET', KEYS[1], cjson.encode(session), 'KEEPTTL')
+return 1
+"""
+
+# Interaction blobs and cached messages are prefixed with a marker byte:
+# Z = zstd, R = raw JSON. Entries written before compression have no marker.
+COMPRESSION_THRESHOLD = 512
+_ZSTD_MARKER = b"Z"
+_RAW_MARKER = b"R"
+_zstd_compressor = zstandard.ZstdCompressor(level=3)
+_zstd_decompressor = zstandard.ZstdDecompressor()
+
+# Per-process record of users known to be over their limit: user_id -> blocked
+# until (monotonic seconds). Lets repeat offenders be rejected without Redis.
+_rate_limit_denials: TTLCache = TTLCache(
+    maxsize=10000,
+    ttl=settings.RATE_LIMIT_PERIOD
+)
+
+
+def _pack_value(data: Dict[str, Any]) -> bytes:
+    """Serialize a cached value, compressing it when it is large"""
+    raw = serialize_for_redis(data)
+    if len(raw) > COMPRESSION_THRESHOLD:
+        return _ZSTD_MARKER + _zstd_compressor.compress(raw)
+    return _RAW_MARKER + raw
+
+
+def _unpack_value(value: bytes) -> Dict[str, Any]:
+    """Inverse of _pack_value, accepting unmarked legacy entries"""
+    marker = value[:1]
+    if marker == _ZSTD_MARKER:
+        return deserialize_from_redis(_zstd_decompressor.decompress(value[1:]))
+    if marker == _RAW_MARKER:
+        return deserialize_from_redis(value[1:])
+    return deserialize_from_redis(value)
+
 
 class CacheService:
     """Service for Redis cache operations"""
@@ -14,6 +145,13 @@ class CacheService:
         self.redis = redis_client
         self.session_ttl = settings.REDIS_TTL_SESSION
         self.interaction_ttl = settings.REDIS_TTL_INTERACTION
+        self.max_cached_messages = settings.REDIS_MAX_CACHED_MESSAGES
+        self._rate_limit_script = self.redis.register_script(RATE_LIMIT_SCRIPT)
+        self._session_script = self.redis.register_script(SESSION_FOR_USER_SCRIPT)
+        self._append_interaction_script = self.redis.register_script(
+            APPEND_INTERACTION_SCRIPT
+        )
+        self._touch_session_script = self.redis.register_script(TOUCH_SESSION_SCRIPT)
     
     # Session Cache Methods
     async def cache_session(self, session_id: str, session_data: Dict[str, Any]) -> bool:
@@ -28,11 +166,14 @@ class CacheService:
             logger.error(f"Failed to cache session {session_id}: {e}")
             return False
     
-    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get session data from Redis"""
+    async def get_session(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get session data from Redis if owned by user, refreshing its TTL"""
         try:
             key = f"session:{session_id}"
-            value = await self.redis.get(key)
+            value = await self._session_script(
+                keys=[key],
+                args=[user_id, self.session_ttl * 1000]
+            )
             if value:
                 return deserialize_from_redis(value)
             return None
@@ -51,116 +192,191 @@ class CacheService:
             logger.error(f"Failed to delete session {session_id}: {e}")
             return False
     
-    async def update_session_activity(self, session_id: str) -> bool:
-        """Update session last active timestamp and refresh TTL"""
+    async def append_interaction_id(
+        self,
+        session_id: str,
+        interaction_id: str,
+        last_active: str
+    ) -> bool:
+        """Add an interaction to a cached session; no-op if it is not cached"""
         try:
             key = f"session:{session_id}"
-            exists = await self.redis.exists(key)
-            if exists:
-                await self.redis.expire(key, self.session_ttl)
-                return True
+            return bool(await self._append_interaction_script(
+                keys=[key],
+                args=[interaction_id, last_active]
+            ))
+        except Exception as e:
+            logger.error(f"Failed to append interaction to session {session_id}: {e}")
+            # Drop the now stale entry so the next read refreshes it
+            await self.delete_session(session_id)
             return False
+    
+    async def touch_session(self, session_id: str, last_active: str) -> bool:
+        """Update last_active on a cached session; no-op if it is not cached"""
+        try:
+            key = f"session:{session_id}"
+            return bool(await self._touch_session_script(
+                keys=[key],
+                args=[last_active]
+            ))
         except Exception as e:
-            logger.error(f"Failed to update session activity {session_id}: {e}")
+            logger.error(f"Failed to touch session {session_id}: {e}")
+            # Drop the now stale entry so the next read refreshes it
+            await self.delete_session(session_id)
             return False
     
     # Interaction Cache Methods
+    # An interaction is cached as a metadata blob under interaction:{id} and
+    # its most recent messages as a capped list under interaction:{id}:messages
     async def cache_interaction(
         self, 
         interaction_id: str, 
         interaction_data: Dict[str, Any]
     ) -> bool:
-        """Cache interaction data in Redis"""
+        """Cache interaction data in Redis, replacing any cached messages"""
         try:
             key = f"interaction:{interaction_id}"
-            value = serialize_for_redis(interaction_data)
-            await self.redis.setex(key, self.interaction_ttl, value)
+            messages_key = f"{key}:messages"
+            metadata = {k: v for k, v in interaction_data.items() if k != "messages"}
+            messages = interaction_data.get("messages", [])[-self.max_cached_messages:]
+            
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.setex(key, self.interaction_ttl, _pack_value(metadata))
+                pipe.delete(messages_key)
+                if messages:
+                    pipe.rpush(messages_key, *map(_pack_value, messages))
+                    pipe.expire(messages_key, self.interaction_ttl)
+                await pipe.execute()
+            
             logger.debug(f"Cached interaction: {interaction_id}")
             return True
         except Exception as e:
             logger.error(f"Failed to cache interaction {interaction_id}: {e}")
             return False
     
+    async def append_message(self, interaction_id: str, message: Dict[str, Any]) -> bool:
+        """Append a message to a cached interaction, keeping the newest ones"""
+        try:
+            key = f"interaction:{interaction_id}"
+            messages_key = f"{key}:messages"
+            
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.rpush(messages_key, _pack_value(message))
+                pipe.ltrim(messages_key, -self.max_cached_messages, -1)
+                pipe.expire(messages_key, self.interaction_ttl)
+                pipe.expire(key, self.interaction_ttl)
+                await pipe.execute()
+            
+            return True
+        except Exception as e:
+            logger.error(f"Failed to append message to interaction {interaction_id}: {e}")
+            # Drop the now incomplete entry; the interaction is read from MongoDB
+            await self.delete_interaction(interaction_id)
+            return False
+    
     async def get_interaction(self, interaction_id: str) -> Optional[Dict[str, Any]]:
-        """Get interaction data from Redis"""
+        """
+        Get interaction data from Redis, with at most max_cached_messages of its
+        most recent messages under "messages"
+        """
         try:
             key = f"interaction:{interaction_id}"
-            value = await self.redis.get(key)
-            if value:
-                data = deserialize_from_redis(value)
-                # Refresh TTL on access
-                await self.redis.expire(key, self.interaction_ttl)
-                return data
-            return None
+            messages_key = f"{key}:messages"
+            
+            # Read both keys and refresh their TTLs in one round trip
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.getex(key, ex=self.interaction_ttl)
+                pipe.lrange(messages_key, 0, -1)
+                pipe.expire(messages_key, self.interaction_ttl)
+                value, messages, _ = await pipe.execute()
+            
+            if not value:
+                return None
+            
+            interaction = _unpack_value(value)
+            if "messages" in interaction:
+                # Cached before messages moved to a list; rewrite in the new layout
+                await self.cache_interaction(interaction_id, interaction)
+            else:
+                unpack = _unpack_value
+                interaction["messages"] = [unpack(message) for message in messages]
+            return interaction
         except Exception as e:
             logger.error(f"Failed to get interaction {interaction_id}: {e}")
             return None
     
+    async def interaction_exists(self, interaction_id: str) -> bool:
+        """Check an interaction is still cached; assumes it is if Redis fails"""
+        try:
+            return bool(await self.redis.exists(f"interaction:{interaction_id}"))
+        except Exception as e:
+            logger.error(f"Failed to check interaction {interaction_id}: {e}")
+            return True
+    
     async def delete_interaction(self, interaction_id: str) -> bool:
         """Delete interaction from Redis"""
         try:
             key = f"interaction:{interaction_id}"
-            await self.redis.delete(key)
+            await self.redis.delete(key, f"{key}:messages")
             logger.debug(f"Deleted interaction: {interaction_id}")
             return True
         except Exception as e:
             logger.error(f"Failed to delete interaction {interaction_id}: {e}")
             return False
     
-    async def check_interaction_expired(self, interaction_id: str) -> bool:
-        """Check if interaction has expired in Redis"""
-        try:
-            key = f"interaction:{interaction_id}"
-            exists = await self.redis.exists(key)
-            return not exists
-        except Exception as e:
-            logger.error(f"Failed to check interaction expiry {interaction_id}: {e}")
-            return True
-    
     # Rate Limiting Methods
-    async def check_rate_limit(self, user_id: str) -> bool:
+    def _rate_limit_args(self, cost: int) -> List[float]:
+        """Build token bucket script arguments: capacity, refill per ms, cost"""
+        capacity = settings.RATE_LIMIT_REQUESTS
+        refill_per_ms = capacity / (settings.RATE_LIMIT_PERIOD * 1000)
+        return [capacity, refill_per_ms, cost]
+    
+    async def check_rate_limit(self, user_id: str) -> Tuple[bool, int]:
         """
         Check if user has exceeded rate limit
-        Returns True if within limit, False if exceeded
+        Returns (True, 0) if within limit, (False, seconds until retry) if exceeded
         """
         try:
-            key = f"rate_limit:{user_id}"
-            current = await self.redis.get(key)
+            blocked_until = _rate_limit_denials.get(user_id)
+            if blocked_until is not None:
+                remaining = blocked_until - time.monotonic()
+                if remaining > 0:
+                    return False, math.ceil(remaining)
+                _rate_limit_denials.pop(user_id, None)
             
-            if current is None:
-                # First request, set counter
-                await self.redis.setex(
-                    key, 
-                    settings.RATE_LIMIT_PERIOD, 
-                    1
-                )
-                return True
+            key = f"rate_limit_bucket:{user_id}"
+            allowed, _, _, retry_after_ms = await self._rate_limit_script(
+                keys=[key],
+                args=self._rate_limit_args(cost=1)
+            )
             
-            current_count = int(current)
-            if current_count >= settings.RATE_LIMIT_REQUESTS:
+            if not allowed:
                 logger.warning(f"Rate limit exceeded for user: {user_id}")
-                return False
+                retry_after = int(retry_after_ms) / 1000
+                _rate_limit_denials[user_id] = time.monotonic() + retry_after
+                return False, math.ceil(retry_after)
             
-            # Increment counter
-            await self.redis.incr(key)
-            return True
+            return True, 0
             
         except Exception as e:
             logger.error(f"Failed to check rate limit for {user_id}: {e}")
             # Allow request on error
-            return True
+            return True, 0
     
     async def get_rate_limit_info(self, user_id: str) -> Dict[str, int]:
         """Get rate limit information for user"""
         try:
-            key = f"rate_limit:{user_id}"
-            current = await self.redis.get(key)
-            ttl = await self.redis.ttl(key)
+            key = f"rate_limit_bucket:{user_id}"
+            # Zero cost: read the refilled bucket without consuming a token
+            _, tokens, ms_until_full, _ = await self._rate_limit_script(
+                keys=[key],
+                args=self._rate_limit_args(cost=0)
+            )
             
             return {
-                "requests_made": int(current) if current else 0,
+                "requests_made": settings.RATE_LIMIT_REQUESTS - int(tokens),
                 "requests_limit": settings.RATE_LIMIT_REQUESTS,
-                "reset_in_seconds": ttl if ttl > 0 else 0
+                "reset_in_seconds": math.ceil(int(ms_until_full) / 1000)
             }
         except Exception as e:
             logger.error(f"Failed to get rate limit info for {user_id}: {e}")
@@ -1,12 +1,16 @@
-from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import DESCENDING, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.asynchronous.database import AsyncDatabase
+from app.config.settings import settings
 from app.services.cache_service import CacheService
 from app.services.ai_service import ai_service
 from app.models import (
     session_document,
     interaction_document,
-    message_pair,
+    message_document,
     SESSIONS_COLLECTION,
-    INTERACTIONS_COLLECTION
+    INTERACTIONS_COLLECTION,
+    MESSAGES_COLLECTION
 )
 from app.utils import (
     generate_session_id,
@@ -16,20 +20,130 @@ from app.utils import (
     format_timestamp,
     sanitize_message
 )
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set, Tuple, Union
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Session fields returned by get_session
+SESSION_PROJECTION = {
+    "_id": 0,
+    "session_id": 1,
+    "user_id": 1,
+    "interaction_ids": 1,
+    "created_at": 1,
+    "last_active": 1
+}
+
 
 class ChatService:
     """Service for chat business logic"""
     
-    def __init__(self, db: AsyncIOMotorDatabase, cache_service: CacheService):
+    def __init__(self, db: AsyncDatabase, cache_service: CacheService):
         self.db = db
         self.cache = cache_service
         self.sessions_collection = self.db[SESSIONS_COLLECTION]
         self.interactions_collection = self.db[INTERACTIONS_COLLECTION]
+        self.messages_collection = self.db[MESSAGES_COLLECTION]
+        
+        # Writes that need no result are coalesced into bulk_write calls:
+        # collection name -> queued (operation, attempts so far)
+        self._pending_writes: Dict[str, List[Tuple[Union[InsertOne, UpdateOne], int]]] = {}
+        self._pending_count = 0
+        self._flush_timer: Optional[asyncio.Task] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._flush_lock = asyncio.Lock()
+    
+    def _enqueue_write(
+        self,
+        collection_name: str,
+        operation: Union[InsertOne, UpdateOne],
+        attempts: int = 0
+    ) -> None:
+        """Queue a write for the next bulk flush"""
+        self._pending_writes.setdefault(collection_name, []).append((operation, attempts))
+        self._pending_count += 1
+        
+        if self._pending_count >= settings.WRITE_BATCH_MAX_OPS:
+            self._spawn_flush(self.flush_writes())
+        elif self._flush_timer is None:
+            self._flush_timer = self._spawn_flush(self._flush_writes_later())
+    
+    def _spawn_flush(self, coro) -> asyncio.Task:
+        """Run a flush in the background, keeping a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+        return task
+    
+    async def _flush_writes_later(self) -> None:
+        await asyncio.sleep(settings.WRITE_BATCH_INTERVAL_MS / 1000)
+        self._flush_timer = None
+        await self.flush_writes()
+    
+    async def flush_writes(self) -> None:
+        """Send all queued writes, one unordered bulk_write per collection"""
+        # Serialized so a flush never races the one before it
+        async with self._flush_lock:
+            pending, self._pending_writes = self._pending_writes, {}
+            self._pending_count = 0
+            if not pending:
+                return
+            
+            names = list(pending)
+            results = await asyncio.gather(
+                *(
+                    self.db[name].bulk_write([op for op, _ in pending[name]], ordered=False)
+                    for name in names
+                ),
+                return_exceptions=True
+            )
+            for name, result in zip(names, results):
+                if isinstance(result, Exception):
+                    self._requeue_failed_writes(name, pending[name], result)
+    
+    def _requeue_failed_writes(
+        self,
+        collection_name: str,
+        queued: List[Tuple[Union[InsertOne, UpdateOne], int]],
+        error: Exception
+    ) -> None:
+        """Re-queue the writes of a failed bulk_write that did not apply"""
+        if isinstance(error, BulkWriteError):
+            # Only the ops listed in writeErrors failed; a duplicate key on an
+            # insert means the document is already stored
+            failed = [
+                queued[write_error["index"]]
+                for write_error in error.details.get("writeErrors", [])
+                if write_error.get("code") != 11000
+            ]
+        else:
+            # Transient (network, timeout) errors: outcome unknown, retry all
+            failed = queued
+        
+        retried = 0
+        for operation, attempts in failed:
+            if attempts < settings.WRITE_BATCH_MAX_RETRIES:
+                self._enqueue_write(collection_name, operation, attempts + 1)
+                retried += 1
+        
+        logger.error(
+            "Failed to flush %s writes to %s (%s re-queued, %s dropped): %s",
+            len(failed), collection_name, retried, len(failed) - retried, error
+        )
+    
+    async def close(self) -> None:
+        """Flush queued writes; call before the database client is closed"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        # Re-queued writes are retried a bounded number of times
+        while self._pending_writes:
+            await self.flush_writes()
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
     
     async def create_session(self, user_id: str) -> Dict[str, Any]:
         """Create a new chat session"""
@@ -39,60 +153,63 @@ class ChatService:
             # Create session document
             session_doc = session_document(session_id, user_id)
             
-            # Save to MongoDB
-            await self.sessions_collection.insert_one(session_doc)
-            
-            # Cache session
-            await self.cache.cache_session(session_id, {
-                "session_id": session_id,
-                "user_id": user_id,
-                "interaction_ids": [],
-                "created_at": format_timestamp(session_doc["created_at"]),
-                "last_active": format_timestamp(session_doc["last_active"])
-            })
+            # created_at and last_active share one timestamp
+            created_at = format_timestamp(session_doc["created_at"])
+            
+            # Save to MongoDB and cache concurrently. Both are awaited so a
+            # following create_interaction finds the cached session to patch.
+            inserted, _ = await asyncio.gather(
+                self.sessions_collection.insert_one(session_doc),
+                self.cache.cache_session(session_id, {
+                    "session_id": session_id,
+                    "user_id": user_id,
+                    "interaction_ids": [],
+                    "created_at": created_at,
+                    "last_active": created_at
+                }),
+                return_exceptions=True
+            )
+            if isinstance(inserted, Exception):
+                # Don't leave a cached session that was never stored
+                await self.cache.delete_session(session_id)
+                raise inserted
             
-            logger.info(f"Created session: {session_id} for user: {user_id}")
+            logger.info("Created session: %s for user: %s", session_id, user_id)
             
             return {
                 "session_id": session_id,
                 "user_id": user_id,
-                "created_at": format_timestamp(session_doc["created_at"])
+                "created_at": created_at
             }
             
         except Exception as e:
-            logger.error(f"Failed to create session: {e}")
+            logger.error("Failed to create session: %s", e)
             raise
     
     async def get_session(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Get session information"""
         try:
             # Try cache first
-            cached = await self.cache.get_session(session_id)
-            if cached and cached.get("user_id") == user_id:
-                await self.cache.update_session_activity(session_id)
+            cached = await self.cache.get_session(session_id, user_id)
+            if cached:
                 return cached
             
             # Fallback to database
-            session = await self.sessions_collection.find_one({
-                "session_id": session_id,
-                "user_id": user_id
-            })
+            session = await self.sessions_collection.find_one(
+                {"_id": session_id, "user_id": user_id},
+                projection=SESSION_PROJECTION
+            )
             
             if not session:
                 return None
             
-            # Update last active
-            await self.sessions_collection.update_one(
-                {"session_id": session_id},
-                {"$set": {"last_active": get_current_timestamp()}}
-            )
-            
+            # last_active is maintained on the write path, not on reads
             session_data = {
                 "session_id": session["session_id"],
                 "user_id": session["user_id"],
                 "interaction_ids": session.get("interaction_ids", []),
                 "created_at": format_timestamp(session["created_at"]),
-                "last_active": format_timestamp(get_current_timestamp())
+                "last_active": format_timestamp(session["last_active"])
             }
             
             # Re-cache
@@ -101,7 +218,7 @@ class ChatService:
             return session_data
             
         except Exception as e:
-            logger.error(f"Failed to get session {session_id}: {e}")
+            logger.error("Failed to get session %s: %s", session_id, e)
             return None
     
     async def create_interaction(
@@ -109,48 +226,71 @@ class ChatService:
         session_id: str, 
         user_id: str
     ) -> Dict[str, Any]:
-        """Create a new interaction within a session"""
+        """
+        Create a new interaction within a session
+        
+        Raises:
+            ValueError: If the session does not exist or belong to the user
+        """
         try:
             interaction_id = generate_interaction_id()
             
-            # Create interaction document
+            # Create interaction document; its timestamp is reused for the session
             interaction_doc = interaction_document(interaction_id, session_id, user_id)
+            now = interaction_doc["created_at"]
+            created_at = format_timestamp(now)
             
-            # Save to MongoDB
-            await self.interactions_collection.insert_one(interaction_doc)
-            
-            # Update session with new interaction
-            await self.sessions_collection.update_one(
-                {"session_id": session_id},
+            # Verify ownership and attach the interaction in one update
+            session = await self.sessions_collection.find_one_and_update(
+                {"_id": session_id, "user_id": user_id},
                 {
                     "$push": {"interaction_ids": interaction_id},
-                    "$set": {"last_active": get_current_timestamp()}
-                }
+                    "$set": {"last_active": now}
+                },
+                projection={"_id": 1}
             )
+            if not session:
+                raise ValueError("Session not found or does not belong to user")
             
-            # Cache interaction
-            await self.cache.cache_interaction(interaction_id, {
-                "interaction_id": interaction_id,
-                "session_id": session_id,
-                "user_id": user_id,
-                "messages": [],
-                "created_at": format_timestamp(interaction_doc["created_at"])
-            })
-            
-            # Update session cache
-            await self.cache.delete_session(session_id)  # Invalidate to force refresh
-            
-            logger.info(f"Created interaction: {interaction_id} in session: {session_id}")
+            # Save to MongoDB, cache the interaction and add it to the
+            # cached session concurrently
+            inserted, _, _ = await asyncio.gather(
+                self.interactions_collection.insert_one(interaction_doc),
+                self.cache.cache_interaction(interaction_id, {
+                    "interaction_id": interaction_id,
+                    "session_id": session_id,
+                    "user_id": user_id,
+                    "messages": [],
+                    "created_at": created_at
+                }),
+                self.cache.append_interaction_id(session_id, interaction_id, created_at),
+                return_exceptions=True
+            )
+            if isinstance(inserted, Exception):
+                # Don't leave the ID attached to the session, or cached,
+                # without an interaction document behind it
+                await asyncio.gather(
+                    self.sessions_collection.update_one(
+                        {"_id": session_id},
+                        {"$pull": {"interaction_ids": interaction_id}}
+                    ),
+                    self.cache.delete_interaction(interaction_id),
+                    self.cache.delete_session(session_id),
+                    return_exceptions=True
+                )
+                raise inserted
+            
+            logger.info("Created interaction: %s in session: %s", interaction_id, session_id)
             
             return {
                 "interaction_id": interaction_id,
                 "session_id": session_id,
-                "created_at": format_timestamp(interaction_doc["created_at"]),
+                "created_at": created_at,
                 "messages_count": 0
             }
             
         except Exception as e:
-            logger.error(f"Failed to create interaction: {e}")
+            logger.error("Failed to create interaction: %s", e)
             raise
     
     async def send_message(
@@ -168,30 +308,32 @@ class ChatService:
             # Sanitize message
             message = sanitize_message(message)
             
+            # A live interaction is in cache; one read covers expiry,
+            # ownership and conversation history
+            cached_interaction = None
+            if interaction_id:
+                cached_interaction = await self.cache.get_interaction(interaction_id)
+                if not cached_interaction:
+                    logger.info("Interaction %s expired, user must create new one", interaction_id)
+                    raise ValueError("Interaction expired. Please create a new interaction.")
+                if cached_interaction.get("user_id") != user_id or (
+                    session_id and cached_interaction.get("session_id") != session_id
+                ):
+                    raise ValueError("Invalid interaction_id")
+            
             # Create session if not provided
             if not session_id:
                 session = await self.create_session(user_id)
                 session_id = session["session_id"]
-            else:
-                # Verify session exists and belongs to user
-                session = await self.get_session(session_id, user_id)
-                if not session:
-                    raise ValueError("Invalid session_id")
             
-            # Check if interaction expired
-            if interaction_id:
-                is_expired = await self.cache.check_interaction_expired(interaction_id)
-                if is_expired:
-                    logger.info(f"Interaction {interaction_id} expired, user must create new one")
-                    raise ValueError("Interaction expired. Please create a new interaction.")
-            
-            # Create interaction if not provided
+            # Create interaction if not provided (verifies session ownership)
             if not interaction_id:
                 interaction = await self.create_interaction(session_id, user_id)
                 interaction_id = interaction["interaction_id"]
-            
-            # Get conversation history
-            history = await self._get_interaction_messages(interaction_id)
+                history = []
+            else:
+                # Get conversation history
+                history = cached_interaction.get("messages", [])
             
             # Format messages for AI
             formatted_messages = ai_service.format_conversation_history(
@@ -204,32 +346,50 @@ class ChatService:
             
             # Create message pair
             message_id = generate_message_id()
-            msg_pair = message_pair(message_id, message, ai_response)
+            message_doc = message_document(
+                message_id,
+                interaction_id,
+                user_id,
+                message,
+                ai_response
+            )
+            now = message_doc["timestamp"]
+            timestamp = format_timestamp(now)
             
-            # Save to MongoDB
-            await self.interactions_collection.update_one(
-                {"interaction_id": interaction_id},
+            # The interaction may have been deleted while the model was
+            # answering; don't queue a message that would be orphaned
+            if not await self.cache.interaction_exists(interaction_id):
+                raise ValueError("Interaction not found")
+            
+            # Save to MongoDB with the next batched flush
+            self._enqueue_write(MESSAGES_COLLECTION, InsertOne(message_doc))
+            self._enqueue_write(INTERACTIONS_COLLECTION, UpdateOne(
+                {"_id": interaction_id},
                 {
-                    "$push": {"messages": msg_pair},
+                    "$inc": {"messages_count": 1},
                     "$set": {
-                        "updated_at": get_current_timestamp(),
-                        "last_message_at": get_current_timestamp()
+                        "updated_at": now,
+                        "last_message_at": now
                     }
                 }
-            )
+            ))
+            self._enqueue_write(SESSIONS_COLLECTION, UpdateOne(
+                {"_id": session_id},
+                {"$set": {"last_active": now}}
+            ))
             
             # Update cache
-            cached_interaction = await self.cache.get_interaction(interaction_id)
-            if cached_interaction:
-                cached_interaction["messages"].append({
+            await asyncio.gather(
+                self.cache.append_message(interaction_id, {
                     "message_id": message_id,
                     "user_message": message,
                     "ai_response": ai_response,
-                    "timestamp": format_timestamp(msg_pair["timestamp"])
-                })
-                await self.cache.cache_interaction(interaction_id, cached_interaction)
+                    "timestamp": timestamp
+                }),
+                self.cache.touch_session(session_id, timestamp)
+            )
             
-            logger.info(f"Message sent in interaction: {interaction_id}")
+            logger.info("Message sent in interaction: %s", interaction_id)
             
             return {
                 "session_id": session_id,
@@ -237,13 +397,13 @@ class ChatService:
                 "message_id": message_id,
                 "user_message": message,
                 "ai_response": ai_response,
-                "timestamp": format_timestamp(msg_pair["timestamp"])
+                "timestamp": timestamp
             }
             
         except ValueError as ve:
             raise ve
         except Exception as e:
-            logger.error(f"Failed to send message: {e}")
+            logger.error("Failed to send message: %s", e)
             raise Exception(f"Failed to send message: {str(e)}")
     
     async def get_chat_history(
@@ -254,37 +414,48 @@ class ChatService:
     ) -> Dict[str, Any]:
         """Get chat history for an interaction"""
         try:
-            # Try cache first
+            # Try cache first; it only holds the complete history while the
+            # interaction is shorter than the cached message cap
             cached = await self.cache.get_interaction(interaction_id)
-            if cached and cached.get("user_id") == user_id:
-                messages = cached.get("messages", [])[-limit:]
+            if (
+                cached
+                and cached.get("user_id") == user_id
+                and len(cached["messages"]) < self.cache.max_cached_messages
+            ):
+                messages = cached["messages"][-limit:]
                 return {
                     "interaction_id": interaction_id,
                     "session_id": cached.get("session_id"),
                     "messages": messages,
-                    "total_messages": len(cached.get("messages", [])),
+                    "total_messages": len(cached["messages"]),
                     "created_at": cached.get("created_at"),
                     "last_updated": format_timestamp(get_current_timestamp())
                 }
             
-            # Fallback to database
-            interaction = await self.interactions_collection.find_one({
-                "interaction_id": interaction_id,
-                "user_id": user_id
-            })
+            # Fallback to database, once queued message writes have landed.
+            # Messages live in their own collection; interactions created
+            # before that still embed a messages array
+            await self.flush_writes()
+            interaction, recent_messages = await asyncio.gather(
+                self._get_interaction_summary(user_id, interaction_id, limit),
+                self._get_recent_messages(user_id, interaction_id, limit)
+            )
             
             if not interaction:
                 raise ValueError("Interaction not found")
             
-            messages = interaction.get("messages", [])[-limit:]
+            # Embedded messages predate the collection ones, so an interaction
+            # that has both shows them in that order
+            messages = (interaction["messages"] + recent_messages)[-limit:]
             
-            # Format messages
+            # Format messages (format bound locally for the per-message loop)
+            fmt = format_timestamp
             formatted_messages = [
                 {
                     "message_id": msg["message_id"],
                     "user_message": msg["user_message"],
                     "ai_response": msg["ai_response"],
-                    "timestamp": format_timestamp(msg["timestamp"]),
+                    "timestamp": fmt(msg["timestamp"]),
                     "metadata": msg.get("metadata", {})
                 }
                 for msg in messages
@@ -294,70 +465,102 @@ class ChatService:
                 "interaction_id": interaction_id,
                 "session_id": interaction["session_id"],
                 "messages": formatted_messages,
-                "total_messages": len(interaction.get("messages", [])),
+                "total_messages": interaction["total_messages"],
                 "created_at": format_timestamp(interaction["created_at"]),
                 "last_updated": format_timestamp(interaction["updated_at"])
             }
             
         except Exception as e:
-            logger.error(f"Failed to get chat history: {e}")
+            logger.error("Failed to get chat history: %s", e)
             raise
     
     async def delete_interaction(
         self,
         user_id: str,
-        interaction_id: str
+        interaction_id: str,
+        detach_from_session: bool = True
     ) -> bool:
-        """Delete an interaction"""
+        """
+        Delete an interaction
+        
+        Args:
+            detach_from_session: Pull the ID from its session; pass False when
+                                 the session itself is being deleted
+        """
         try:
-            # Verify ownership
-            interaction = await self.interactions_collection.find_one({
-                "interaction_id": interaction_id,
-                "user_id": user_id
-            })
+            # Verify ownership and delete in one round trip; only the parent
+            # session is needed from the removed document
+            interaction = await self.interactions_collection.find_one_and_delete(
+                {"_id": interaction_id, "user_id": user_id},
+                projection={"_id": 0, "session_id": 1}
+            )
             
             if not interaction:
                 raise ValueError("Interaction not found")
             
-            # Delete from MongoDB
-            await self.interactions_collection.delete_one({
-                "interaction_id": interaction_id
-            })
-            
-            # Delete from cache
+            # Uncache so send_message stops queuing messages for it, then
+            # flush so an already queued insert lands before the cleanup below
             await self.cache.delete_interaction(interaction_id)
+            await self.flush_writes()
             
-            # Update session
-            await self.sessions_collection.update_one(
-                {"session_id": interaction["session_id"]},
-                {"$pull": {"interaction_ids": interaction_id}}
-            )
-            
-            logger.info(f"Deleted interaction: {interaction_id}")
+            # Delete its messages and detach from the session
+            cleanup = [
+                self.messages_collection.delete_many({"interaction_id": interaction_id})
+            ]
+            if detach_from_session:
+                cleanup.append(self.sessions_collection.update_one(
+                    {"_id": interaction["session_id"]},
+                    {"$pull": {"interaction_ids": interaction_id}}
+                ))
+            await asyncio.gather(*cleanup)
+            
+            logger.info("Deleted interaction: %s", interaction_id)
             return True
             
         except Exception as e:
-            logger.error(f"Failed to delete interaction: {e}")
+            logger.error("Failed to delete interaction: %s", e)
             raise
     
-    async def _get_interaction_messages(self, interaction_id: str) -> List[Dict[str, str]]:
-        """Get all messages from an interaction for AI context"""
-        try:
-            # Try cache first
-            cached = await self.cache.get_interaction(interaction_id)
-            if cached:
-                return cached.get("messages", [])
-            
-            # Fallback to database
-            interaction = await self.interactions_collection.find_one({
-                "interaction_id": interaction_id
-            })
-            
-            if not interaction:
-                return []
-            
-            return interaction.get("messages", [])
-            
-        except Exception as e:
-            logger.error(f"Failed to get interaction messages: {e}")
-            return []
\ No newline at end of file
+    async def _get_interaction_summary(
+        self,
+        user_id: str,
+        interaction_id: str,
+        limit: int
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Get interaction metadata and its total message count; for interactions
+        that still embed messages, also the last `limit` of those, sliced and
+        counted server-side
+        """
+        messages_field = {"$ifNull": ["$messages", []]}
+        cursor = await self.interactions_collection.aggregate([
+            {"$match": {"_id": interaction_id, "user_id": user_id}},
+            {"$project": {
+                "_id": 0,
+                "session_id": 1,
+                "created_at": 1,
+                "updated_at": 1,
+                "total_messages": {"$add": [
+                    {"$size": messages_field},
+                    {"$ifNull": ["$messages_count", 0]}
+                ]},
+                "messages": {"$slice": [messages_field, -limit]}
+            }}
+        ])
+        results = await cursor.to_list(length=1)
+        return results[0] if results else None
+    
+    async def _get_recent_messages(
+        self,
+        user_id: str,
+        interaction_id: str,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """Get the last `limit` messages of an interaction, oldest first"""
+        cursor = self.messages_collection.find(
+            {"interaction_id": interaction_id, "user_id": user_id},
+            projection={"_id": 0, "interaction_id": 0, "user_id": 0}
+        ).sort("timestamp", DESCENDING).limit(limit)
+        messages = await cursor.to_list(length=limit)
+        messages.reverse()
+        return messages
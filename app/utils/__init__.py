@@ -3,7 +3,10 @@ from app.utils.id_generator import (
     generate_session_id,
     generate_interaction_id,
     generate_message_id,
-    validate_uuid
+    generate_user_id,
+    generate_token_id,
+    validate_uuid,
+    validate_prefixed_id
 )
 from app.utils.helpers import (
     get_current_timestamp,
@@ -14,6 +17,7 @@ from app.utils.helpers import (
     serialize_for_redis,
     deserialize_from_redis,
     sanitize_message,
+    hash_token,
     build_error_response,
     build_success_response
 )
@@ -23,7 +27,10 @@ __all__ = [
     "generate_session_id",
     "generate_interaction_id",
     "generate_message_id",
+    "generate_user_id",
+    "generate_token_id",
     "validate_uuid",
+    "validate_prefixed_id",
     "get_current_timestamp",
     "format_timestamp",
     "parse_timestamp",
@@ -32,6 +39,7 @@ __all__ = [
     "serialize_for_redis",
     "deserialize_from_redis",
     "sanitize_message",
+    "hash_token",
     "build_error_response",
     "build_success_response"
 ]
\ No newline at end of file
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-import json
+from typing import Optional, Dict, Any, List, Union
+import hashlib
+import orjson
 
 
 def get_current_timestamp() -> datetime:
@@ -8,9 +9,12 @@ def get_current_timestamp() -> datetime:
     return datetime.utcnow()
 
 
+_ISO_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
 def format_timestamp(dt: datetime) -> str:
-    """Format datetime to ISO 8601 string"""
-    return dt.isoformat() + "Z"
+    """Format UTC datetime to ISO 8601 string"""
+    return dt.strftime(_ISO_FORMAT)
 
 
 def parse_timestamp(timestamp_str: str) -> datetime:
@@ -30,27 +34,38 @@ def is_expired(expiry_time: datetime) -> bool:
     return get_current_timestamp() > expiry_time
 
 
-def serialize_for_redis(data: Dict[Any, Any]) -> str:
-    """Serialize data for Redis storage"""
-    return json.dumps(data, default=str)
+def serialize_for_redis(data: Dict[Any, Any]) -> bytes:
+    """Serialize data for Redis storage (datetimes are encoded natively)"""
+    return orjson.dumps(data, option=orjson.OPT_NAIVE_UTC)
 
 
-def deserialize_from_redis(data: str) -> Dict[Any, Any]:
+def deserialize_from_redis(data: Union[bytes, str]) -> Dict[Any, Any]:
     """Deserialize data from Redis"""
     if not data:
         return {}
-    return json.loads(data)
+    return orjson.loads(data)
 
 
 def sanitize_message(message: str, max_length: int = 10000) -> str:
     """Sanitize and truncate message"""
-    message = message.strip()
-    if len(message) > max_length:
-        message = message[:max_length]
-    return message
+    # Fast path: already trimmed and short enough
+    if len(message) <= max_length and not (
+        message[:1].isspace() or message[-1:].isspace()
+    ):
+        return message
+    return message.strip()[:max_length]
+
+
+def hash_token(token: str) -> bytes:
+    """Compute the 16-byte fingerprint under which a token is stored"""
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
 
 
-def build_error_response(code: str, message: str, details: Optional[str] = None) -> Dict:
+def build_error_response(
+    code: str,
+    message: str,
+    details: Optional[Union[str, List[Dict[str, Any]]]] = None
+) -> Dict:
     """Build standardized error response"""
     error_response = {
         "success": False,
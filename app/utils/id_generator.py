@@ -1,5 +1,6 @@
+import base64
+import os
 import uuid
-from typing import Optional
 
 
 def generate_uuid() -> str:
@@ -7,32 +8,52 @@ def generate_uuid() -> str:
     return str(uuid.uuid4())
 
 
+# Prefixed IDs carry 16 random bytes as 22 unpadded url-safe base64 chars
+_RANDOM_BYTES = 16
+_SUFFIX_LENGTH = 22
+
+
+def _generate_prefixed_id(prefix: bytes) -> str:
+    return (prefix + base64.urlsafe_b64encode(os.urandom(_RANDOM_BYTES))[:_SUFFIX_LENGTH]).decode()
+
+
 def generate_session_id() -> str:
     """Generate a unique session ID"""
-    return f"session_{generate_uuid()}"
+    return _generate_prefixed_id(b"session_")
 
 
 def generate_interaction_id() -> str:
     """Generate a unique interaction ID"""
-    return f"interaction_{generate_uuid()}"
+    return _generate_prefixed_id(b"interaction_")
 
 
 def generate_message_id() -> str:
     """Generate a unique message ID"""
-    return f"message_{generate_uuid()}"
+    return _generate_prefixed_id(b"message_")
+
+
+def generate_user_id() -> str:
+    """Generate a unique user ID"""
+    return _generate_prefixed_id(b"user_")
+
+
+def generate_token_id() -> str:
+    """Generate a unique refresh token record ID"""
+    return _generate_prefixed_id(b"token_")
+
+
+def validate_prefixed_id(prefixed_id: str, prefix: str) -> bool:
+    """Validate if a string is a generated ID with the given prefix"""
+    return (
+        len(prefixed_id) == len(prefix) + 1 + _SUFFIX_LENGTH
+        and prefixed_id.startswith(f"{prefix}_")
+    )
 
 
 def validate_uuid(uuid_string: str) -> bool:
-    """Validate if a string is a valid UUID"""
+    """Validate if a string is a valid UUID (IDs generated before base64 suffixes)"""
     try:
         uuid.UUID(uuid_string)
         return True
     except (ValueError, AttributeError):
         return False
-
-
-def extract_uuid_from_prefixed_id(prefixed_id: str, prefix: str) -> Optional[str]:
-    """Extract UUID from prefixed ID (e.g., 'session_uuid' -> 'uuid')"""
-    if prefixed_id.startswith(f"{prefix}_"):
-        return prefixed_id[len(prefix) + 1:]
-    return None
\ No newline at end of file